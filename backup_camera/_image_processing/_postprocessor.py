@@ -39,7 +39,7 @@ class Postprocessor:
             return None
         frame = self._draw_bounding_boxes_and_icons(frame, detection_metadata)
         frame = self._draw_guidelines(frame, image_parameters, application_mode)
-        return cv.cvtColor(frame, cv.COLOR_BGR2RGB)
+        return frame    # BGR to RGB conversion is done by user interface straight into its display buffer
 
 
     def _draw_guidelines(self, frame, image_parameters, application_mode):
@@ -14,6 +14,8 @@ MIN_Y_LINE_HEIGHT = 0
 MAX_Y_LINE_HEIGHT = 100
 NUMBER_OF_LINES_OPTIONS = [1, 2, 3]
 DEFAULT_NUMBER_OF_LINES = 3
+MAXIMUM_FRAMERATE_OPTIONS = [15, 25, 30, 50, 60]
+DEFAULT_MAXIMUM_FRAMERATE = 50
 
 
 @dataclass
@@ -31,6 +33,7 @@ class ImageParameters:
     spacing: int = 0
     tilt: int = 0
     y_line_height: int = 0
+    maximum_framerate: int = DEFAULT_MAXIMUM_FRAMERATE
 
     def save_to_file(self):
         with open('configuration.json', 'w') as file:
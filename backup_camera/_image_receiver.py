@@ -6,6 +6,8 @@ funkcjonalnością będzie również możliwość symulacji pobierania obrazu z
 kamery poprzez wczytanie pliku wideo. Pozwoli to na przeprowadzenie testów 
 systemu na przygotowanych wcześniej nagraniach.
 """
+import threading
+
 import cv2 as cv
 from cv2.typing import MatLike
 
@@ -13,28 +15,55 @@ from cv2.typing import MatLike
 MAX_NUMBER_OF_CAMERAS = 10
 NO_VIDEO_CAPTURE = -2
 CAPTURE_VIDEO_FILE = -1
+RELEASE_TIMEOUT_SECONDS = 1.0
 
 
 class ImageReceiver:
         
     def __init__(self) -> None:
         self._video_capture = None
+        self._requested_source = None
+        self._source_change_requested = False
+        self._request_lock = threading.Lock()
+        self._read_lock = threading.Lock()     # VideoCapture is only touched by the thread reading frames
     
     def start_capture(self, source: str|int) -> None:
-        self.end_capture()
-        self._video_capture = cv.VideoCapture(source)
+        self._request_source_change(source)
     
     def end_capture(self) -> None:
-        if self._video_capture is None:
-            return
-        self._video_capture.release()
-        self._video_capture = None
+        self._request_source_change(None)
     
     def get_frame(self) -> MatLike|None:
-        if self._video_capture is None:
-            return None
-        _, frame = self._video_capture.read()
-        return frame
+        with self._read_lock:
+            self._apply_source_change()
+            if self._video_capture is None:
+                return None
+            _, frame = self._video_capture.read()
+            return frame
+    
+    def release(self) -> None:
+        if not self._read_lock.acquire(timeout=RELEASE_TIMEOUT_SECONDS):
+            return  # read is stuck on an unresponsive device, capture is freed on process exit
+        try:
+            self._request_source_change(None)
+            self._apply_source_change()
+        finally:
+            self._read_lock.release()
+    
+    def _request_source_change(self, source: str|int|None) -> None:
+        with self._request_lock:
+            self._requested_source = source
+            self._source_change_requested = True
+    
+    def _apply_source_change(self) -> None:
+        with self._request_lock:
+            if not self._source_change_requested:
+                return
+            source = self._requested_source
+            self._source_change_requested = False
+        if self._video_capture is not None:
+            self._video_capture.release()
+        self._video_capture = None if source is None else cv.VideoCapture(source)
     
     @staticmethod
     def get_available_sources() -> dict[str, int]:
@@ -5,18 +5,21 @@ ostrzegawczych czy prezentowanie przetworzonego obrazu z kamery, który odbiera
 z silnika przetwarzania obrazu. Jego częścią będą również menu służące do zmiany aktualnej 
 konfiguracji systemu. 
 """
+import threading
+import time
+import zlib
+from functools import partial
 import tkinter as tk
 from tkinter import filedialog
 
 import cv2 as cv
 from cv2.typing import MatLike
 import numpy as np
-from PIL import Image
-from PIL import ImageTk
 
 from backup_camera.application import Application
 from backup_camera.application import ApplicationMode
 from backup_camera._image_processing.image_porcessor import ImageProcessingEngine
+from backup_camera._image_processing.image_parameters import MAXIMUM_FRAMERATE_OPTIONS
 from backup_camera._image_receiver import ImageReceiver
 from backup_camera._image_receiver import NO_VIDEO_CAPTURE
 from backup_camera._user_interface._detection_properties_frame import DetectionPropertiesFrame
@@ -24,7 +27,31 @@ from backup_camera._user_interface._guidelines_properties_frame import Guideline
 from backup_camera._user_interface._image_properties_frame import ImagePropertiesFrame
 
 
-MILISECONDS_PER_FRAME = 20
+SOURCE_SCAN_POLL_MILISECONDS = 100
+HIDDEN_WINDOW_POLL_MILISECONDS = 250
+FRAME_POLL_MILISECONDS = 5
+CAPTURE_THREAD_JOIN_TIMEOUT_SECONDS = 1.0
+
+
+def _allocate_ppm_buffer(width: int, height: int) -> tuple[bytearray, np.ndarray]:
+    header = b'P6\n%d %d\n255\n' % (width, height)
+    ppm_buffer = bytearray(header) + bytearray(width * height * 3)
+    pixels = np.frombuffer(ppm_buffer, dtype=np.uint8, offset=len(header)).reshape((height, width, 3))
+    return ppm_buffer, pixels   # pixels is a view on PPM pixel data, no copy
+
+
+# Single entry point for uploading a frame to Tk. Tk always receives binary PPM data;
+# do not fall back to PhotoImage.put with '#rrggbb' strings, which costs Python work per pixel.
+def _put_bgr_ndarray(photo: tk.PhotoImage, frame: MatLike, ppm_buffer: bytearray, pixels: np.ndarray) -> None:
+    cv.cvtColor(frame, cv.COLOR_BGR2RGB, dst=pixels)    # pixels is a view on ppm_buffer
+    photo.tk.call(photo.name, 'put', bytes(ppm_buffer), '-format', 'PPM')  # PhotoImage.put has no format argument
+
+
+def _create_photo_from_bgr_ndarray(frame: MatLike) -> tk.PhotoImage:
+    height, width = frame.shape[:2]
+    photo = tk.PhotoImage(width=width, height=height)
+    _put_bgr_ndarray(photo, frame, *_allocate_ppm_buffer(width, height))
+    return photo
 
 
 class UserInteface:
@@ -40,13 +67,45 @@ class UserInteface:
         self._display_size = (display_size[1], display_size[0])
         self._guidelines_hidden = tk.BooleanVar(value=parent_application.get_config()['guidelines_hidden'])
         self._mute_sounds = tk.BooleanVar(value=False)
+        self._maximum_framerate = tk.IntVar(value=parent_application.get_config()['maximum_framerate'])
+        self._period_ms = 1000 // self._maximum_framerate.get()
+        
+        self._latest_frame = None
+        self._latest_frame_hash = None
+        self._latest_frame_number = 0
+        self._painted_frame_number = None
+        self._latest_frame_lock = threading.Lock()
+        self._capture_stopped = threading.Event()
+        self._capture_thread = threading.Thread(target=self._capture_frames, daemon=True)
+        
+        self._window_visible = True
+        self._window.bind('<Map>', self._on_window_visibility_changed)
+        self._window.bind('<Unmap>', self._on_window_visibility_changed)
         
         self._menubar = tk.Menu(master=self._window)
         self._init_mode_menu(parent_application.application_mode)
         self._init_source_menu()
+        self._init_config_menu()
         self._window.config(menu=self._menubar)
         
-        self._display = tk.Label(master=self._window)
+        self._ppm_buffer, self._frame_buffer = _allocate_ppm_buffer(display_size[0], display_size[1])
+        self._resize_buffer = np.empty((*self._display_size, 3), dtype=np.uint8)
+        self._placeholder_image = np.zeros((*self._display_size, 3), dtype=np.uint8)
+        cv.putText(
+            img=self._placeholder_image, 
+            text='<NO VIDEO TO DISPLAY>', 
+            org=(self._display_size[1] // 4, self._display_size[0] // 2), 
+            fontFace=cv.FONT_HERSHEY_PLAIN, 
+            fontScale=2, 
+            color=(255, 255, 255), 
+            thickness=1
+        )
+        self._last_frame_hash = None
+        self._photo = tk.PhotoImage(width=display_size[0], height=display_size[1])
+        self._placeholder_photo = self._build_placeholder_photo()
+        self._displayed_photo = self._photo
+        
+        self._display = tk.Label(master=self._window, image=self._photo)
         self._display.pack(fill=tk.BOTH)
         
         self._mode_label = tk.Label(self._window)
@@ -66,6 +125,7 @@ class UserInteface:
             self._parent_application,
             self._mute_sounds
         )
+        self._active_properties_frame = None
         self._enter_mirror_mode()
     
     def _enter_mirror_mode(self):
@@ -79,88 +139,75 @@ class UserInteface:
         self._parent_application.application_mode = ApplicationMode.PARK_ASSISTANT
     
     def _enter_config_mode(self):
-        self._reload_default_layout()
+        self._hide_properties_frame()
         self._mode_label.config(text='CONFIGURATION')
+        if not self._config_menu_attached:
+            self._menubar.add_cascade(menu=self._config_menu, label='Configuration')
+            self._config_menu_attached = True
         self._parent_application.application_mode = ApplicationMode.CONFIGURATION
-        
-        self._config_menu = tk.Menu(master=self._menubar, tearoff=0)
-        
-        self._config_menu.add_command(
-            label='Open image properties', 
-            command=self._show_image_properties
-        )
-        
-        self._config_menu.add_separator()
-        
-        self._config_menu.add_checkbutton(
-            label='Guidlines hidden',
-            variable=self._guidelines_hidden,
-            command=self.change_guidelines_visibility
-        )
-        
-        self._config_menu.add_command(
-            label='Open guidelines properties', 
-            command=self._show_guidelines_properties
-        )
-        
-        self._config_menu.add_separator()
-        
-        self._config_menu.add_checkbutton(
-            label='Mute alerts',
-            variable=self._mute_sounds,
-            command=self._parent_application.change_mute_sounds
-        )
-        
-        self._config_menu.add_command(
-            label='Open detection properties',
-            command=self._show_detection_properties
-        )
-        
-        self._menubar.add_cascade(menu=self._config_menu, label='Configuration')
     
     def _hide_properties_frame(self):
-        if self._guidelines_properties_frame.winfo_viewable():
-            self._guidelines_properties_frame.place_forget()
-        elif self._image_properties_frame.winfo_viewable():
-            self._image_properties_frame.place_forget()
-        elif self._detection_properties_frame.winfo_viewable():
-            self._detection_properties_frame.place_forget()
+        if self._active_properties_frame is not None:
+            self._active_properties_frame.place_forget()
+            self._active_properties_frame = None
     
     def _reload_default_layout(self):
-        if self._menubar.index('end') > 2:                      
-            self._menubar.delete(self._menubar.index('end')) # delete configuration menu when not in configuration mode
+        if self._config_menu_attached:
+            self._menubar.delete(self._menubar.index('end')) # detach configuration menu when not in configuration mode
+            self._config_menu_attached = False
         self._hide_properties_frame()
     
     def _show_image_properties(self):
         self._hide_properties_frame()
         self._image_properties_frame.place(x=10, y=40)
+        self._active_properties_frame = self._image_properties_frame
     
     def _show_guidelines_properties(self):
         self._hide_properties_frame()
         self._guidelines_properties_frame.place(x=10, y=40)
+        self._active_properties_frame = self._guidelines_properties_frame
     
     def _show_detection_properties(self):
         self._hide_properties_frame()
         self._detection_properties_frame.place(x=10, y=40)
+        self._active_properties_frame = self._detection_properties_frame
     
     def change_guidelines_visibility(self):
         self._parent_application.set_guidelines_visibility(self._guidelines_hidden.get())
     
+    def change_maximum_framerate(self):
+        self._period_ms = 1000 // self._maximum_framerate.get()
+        self._parent_application.set_maximum_framerate(self._maximum_framerate.get())
+    
     def _init_source_menu(self):
         self._source_menu = tk.Menu(master=self._menubar, tearoff=0)
         self._selected_video_source_id = tk.IntVar()
+        self._source_menu.add_command(label='Scanning...', state=tk.DISABLED)
+        self._selected_video_source_id.set(NO_VIDEO_CAPTURE)
+        self._menubar.add_cascade(menu=self._source_menu, label='Video source')
         
-        sources = ImageReceiver.get_available_sources()
+        self._available_sources = None
+        threading.Thread(target=self._enumerate_sources, daemon=True).start()
+        self._window.after(SOURCE_SCAN_POLL_MILISECONDS, self._poll_available_sources)
+    
+    def _enumerate_sources(self):
+        self._available_sources = ImageReceiver.get_available_sources()     # probing cameras may take a while
+    
+    def _poll_available_sources(self):
+        if self._available_sources is None:
+            self._window.after(SOURCE_SCAN_POLL_MILISECONDS, self._poll_available_sources)
+            return
+        self._populate_source_menu(self._available_sources)
+    
+    def _populate_source_menu(self, sources: dict[str, int]):
+        self._source_menu.delete(0, 'end')
         for source_name in sources:
             self._source_menu.add_radiobutton(
                 label=source_name, 
                 variable=self._selected_video_source_id, 
                 value=sources[source_name],
-                command=lambda source_index=sources[source_name]: self._parent_application.set_source(source_index)
+                command=partial(self._parent_application.set_source, sources[source_name])
             )
-            
-        self._selected_video_source_id.set(NO_VIDEO_CAPTURE)
-        self._menubar.add_cascade(menu=self._source_menu, label='Video source')
         
     def _init_mode_menu(self, application_mode: ApplicationMode):
         self._mode_menu = tk.Menu(master=self._menubar, tearoff=0)
@@ -189,9 +236,59 @@ class UserInteface:
         
         self._menubar.add_cascade(menu=self._mode_menu, label='Mode')
     
+    def _init_config_menu(self):
+        self._config_menu = tk.Menu(master=self._menubar, tearoff=0)
+        
+        self._config_menu.add_command(
+            label='Open image properties', 
+            command=self._show_image_properties
+        )
+        
+        self._config_menu.add_separator()
+        
+        self._config_menu.add_checkbutton(
+            label='Guidlines hidden',
+            variable=self._guidelines_hidden,
+            command=self.change_guidelines_visibility
+        )
+        
+        self._config_menu.add_command(
+            label='Open guidelines properties', 
+            command=self._show_guidelines_properties
+        )
+        
+        self._config_menu.add_separator()
+        
+        self._config_menu.add_checkbutton(
+            label='Mute alerts',
+            variable=self._mute_sounds,
+            command=self._parent_application.change_mute_sounds
+        )
+        
+        self._config_menu.add_command(
+            label='Open detection properties',
+            command=self._show_detection_properties
+        )
+        
+        self._config_menu.add_separator()
+        
+        self._framerate_menu = tk.Menu(master=self._config_menu, tearoff=0)
+        for maximum_framerate in MAXIMUM_FRAMERATE_OPTIONS:
+            self._framerate_menu.add_radiobutton(
+                label=f'{maximum_framerate} FPS',
+                variable=self._maximum_framerate,
+                value=maximum_framerate,
+                command=self.change_maximum_framerate
+            )
+        self._config_menu.add_cascade(menu=self._framerate_menu, label='Maximum framerate')
+        self._config_menu_attached = False
+    
     def show(self) -> None:
-        self._updateVideoFrame(self._video_source.process_next_frame())
+        self._capture_thread.start()
+        self._tick()
         self._window.mainloop()
+        self._capture_stopped.set()
+        self._capture_thread.join(timeout=CAPTURE_THREAD_JOIN_TIMEOUT_SECONDS)   # may be stuck reading a stalled camera
     
     def mute(self):
         if self._mute_sounds.get():
@@ -199,31 +296,66 @@ class UserInteface:
         else:
             self._mute_label.place_forget()
 
-    def _updateVideoFrame(self, video_frame: MatLike):
-        if video_frame is None or video_frame.shape[0] != self._display_size[0]\
-           or video_frame.shape[1] != self._display_size[1]:
-            video_frame = self._generate_placeholder_image()
-        
-        video_frame = ImageTk.PhotoImage(Image.fromarray(video_frame))
-        self._display.photo_image = video_frame
-        self._display.configure(image=video_frame)
-        self._display.after(
-            MILISECONDS_PER_FRAME, 
-            lambda frame=self._video_source.process_next_frame(): self._updateVideoFrame(frame)
-        )
+    def _on_window_visibility_changed(self, event: tk.Event):
+        if event.widget is not self._window:     # root bindings also fire for every child widget
+            return
+        self._window_visible = event.type == tk.EventType.Map
+    
+    def _capture_frames(self):
+        while not self._capture_stopped.is_set():
+            start_time = time.perf_counter()
+            video_frame = self._video_source.process_next_frame()
+            frame_hash = zlib.crc32(video_frame) \
+                if video_frame is not None and video_frame.flags.c_contiguous else None  # hashed here, off GUI thread
+            with self._latest_frame_lock:
+                self._latest_frame = video_frame
+                self._latest_frame_hash = frame_hash
+                self._latest_frame_number += 1
+            elapsed_time = time.perf_counter() - start_time
+            self._capture_stopped.wait(max(0.0, self._period_ms / 1000 - elapsed_time))
+    
+    def _tick(self):
+        if not self._window_visible:    # frames are still processed, so detection alerts keep working
+            self._display.after(HIDDEN_WINDOW_POLL_MILISECONDS, self._tick)
+            return
+        with self._latest_frame_lock:
+            frame_number = self._latest_frame_number
+            video_frame = self._latest_frame
+            frame_hash = self._latest_frame_hash
+        if frame_number != self._painted_frame_number:    # paint on frame arrival, the worker sets the rate
+            self._painted_frame_number = frame_number
+            self._updateVideoFrame(video_frame, frame_hash)
+        self._display.after(FRAME_POLL_MILISECONDS, self._tick)
+
+    def _updateVideoFrame(self, video_frame: MatLike, frame_hash: int|None):
+        if video_frame is None or video_frame.ndim != 3 or video_frame.shape[2] != 3:
+            self._show_photo(self._placeholder_photo)
+            return
+        
+        self._show_photo(self._photo)
+        if frame_hash is not None and frame_hash == self._last_frame_hash:
+            return
+        self._last_frame_hash = frame_hash
+        if video_frame.shape[:2] != self._display_size:
+            video_frame = cv.resize(
+                video_frame, 
+                (self._display_size[1], self._display_size[0]), 
+                dst=self._resize_buffer, 
+                interpolation=cv.INTER_LINEAR
+            )
+        _put_bgr_ndarray(self._photo, video_frame, self._ppm_buffer, self._frame_buffer)
+    
+    def _show_photo(self, photo: tk.PhotoImage):
+        if self._displayed_photo is photo:
+            return
+        self._display.configure(image=photo)
+        self._displayed_photo = photo
     
     def select_video_file(self):
         return filedialog.askopenfilename(filetypes=[("MP4 Files", "*.mp4")])
         
+    def _build_placeholder_photo(self) -> tk.PhotoImage:
+        return _create_photo_from_bgr_ndarray(self._generate_placeholder_image())
+    
     def _generate_placeholder_image(self) -> MatLike:
-        image = np.zeros(self._display_size, dtype=np.uint8)
-        image = cv.putText(
-            img=image, 
-            text='<NO VIDEO TO DISPLAY>', 
-            org=(self._display_size[1] // 4, self._display_size[0] // 2), 
-            fontFace=cv.FONT_HERSHEY_PLAIN, 
-            fontScale=2, 
-            color=(255, 255, 255), 
-            thickness=1
-        )
-        return image
+        return self._placeholder_image
@@ -42,7 +42,7 @@ class Application:
 
     def run(self):
         self._ui.show()
-        self._image_receiver.end_capture()
+        self._image_receiver.release()
         self._image_parameters.save_to_file()
     
     def set_image_properties(self, brightness, contrast, saturation):
@@ -66,6 +66,9 @@ class Application:
     def set_guidelines_visibility(self, guidelines_hidden):
         self._image_parameters.guidelines_hidden = guidelines_hidden
     
+    def set_maximum_framerate(self, maximum_framerate):
+        self._image_parameters.maximum_framerate = maximum_framerate
+    
     def change_mute_sounds(self):
         self._ui.mute()
         self._muted = not self._muted